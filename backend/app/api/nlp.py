@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any, Dict, List
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from loguru import logger
 
-from ..services.nlp_rasa import RasaClient
+from ..services.nlp_rasa import get_rasa
+from ..services.semantic_cache import get_semantic_cache
 
 router = APIRouter()
 
@@ -17,10 +19,18 @@ class NLPIn(BaseModel):
 
 
 @router.post("/nlp", tags=["nlp"])  # /api/nlp
-async def nlp_message(payload: NLPIn) -> List[Dict[str, Any]]:
+async def nlp_message(payload: NLPIn, request: Request) -> List[Dict[str, Any]]:
     try:
-        client = RasaClient()
-        return await client.send_message(sender_id=payload.sender_id, message=payload.message)
+        cache = get_semantic_cache(request.app)
+        if cache:
+            vec = await asyncio.to_thread(cache.embed, payload.message)
+            hit = cache.lookup("nlp", vec)
+            if hit is not None:
+                return hit
+        data = await get_rasa(request.app).send_message(sender_id=payload.sender_id, message=payload.message)
+        if cache:
+            cache.add("nlp", vec, data)
+        return data
     except Exception as e:
         logger.exception("NLP (Rasa) call failed")
         raise HTTPException(status_code=500, detail=str(e))
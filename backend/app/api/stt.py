@@ -1,85 +1,214 @@
 from __future__ import annotations
 
-import os
+import asyncio
+import io
 import shutil
-import subprocess
+import struct
 import tempfile
+from asyncio.subprocess import Process
 from pathlib import Path
+from typing import AsyncIterator
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
 from loguru import logger
 
-from ..services.stt_vosk import VoskSTT
-from ..core.config import settings
+from ..services.ffmpeg_pool import SEEKABLE_FORMATS, FfmpegPool, get_ffmpeg_path, get_ffmpeg_pool, sniff_format
+from ..services.stt_vosk import get_stt
 
 router = APIRouter()
 
+UPLOAD_CHUNK_BYTES = 64 * 1024
 
-@router.post("/stt", tags=["stt"])  # /api/stt
-async def stt_transcribe(file: UploadFile = File(...)) -> dict:
+# Content-Type fallback for raw bodies whose magic bytes sniff_format does not know
+MIME_FORMATS = {
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/ogg": "ogg",
+    "audio/webm": "matroska",
+    "audio/mpeg": "mp3",
+    "audio/flac": "flac",
+    "audio/aac": "aac",
+    "audio/mp4": "mov",
+}
+
+
+def _is_vosk_native_wav(head: bytes) -> bool:
+    """True if the RIFF header describes mono 16 kHz 16-bit PCM, i.e. nothing for ffmpeg to do."""
+    if head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return False
+    pos = 12
+    while pos + 8 <= len(head):
+        chunk_id, size = struct.unpack_from("<4sI", head, pos)
+        if chunk_id == b"fmt ":
+            if size < 16 or pos + 24 > len(head):
+                return False
+            audio_format, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", head, pos + 8)
+            return audio_format == 1 and channels == 1 and sample_rate == 16000 and bits == 16
+        pos += 8 + size + (size & 1)  # chunks are word-aligned
+    return False
+
+
+async def _upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+
+async def _feed_stdin(proc: Process, head: bytes, chunks: AsyncIterator[bytes]) -> None:
+    assert proc.stdin is not None
     try:
-        # 1) Persist upload to a temp file (preserve original extension if present)
-        orig_suffix = Path(file.filename or "audio").suffix or ".bin"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=orig_suffix) as src_tmp:
-            src_path = Path(src_tmp.name)
-            src_tmp.write(await file.read())
-
-        # 2) If ffmpeg is available, normalize to mono 16k s16 WAV
-        dst_path: Path | None = None
-        ffmpeg_path = settings.FFMPEG_BIN or os.getenv("FFMPEG_BIN") or shutil.which("ffmpeg")
-        # If FFMPEG_BIN is a directory, append the executable name
-        if ffmpeg_path and os.path.isdir(ffmpeg_path):
-            candidate = os.path.join(ffmpeg_path, "ffmpeg.exe" if os.name == "nt" else "ffmpeg")
-            if os.path.isfile(candidate):
-                ffmpeg_path = candidate
-        if ffmpeg_path:
-            fd, out_name = tempfile.mkstemp(suffix=".wav")
-            os.close(fd)
-            dst_path = Path(out_name)
-            cmd = [
-                ffmpeg_path,
-                "-y",
-                "-i",
-                str(src_path),
-                "-ac",
-                "1",
-                "-ar",
-                "16000",
-                "-sample_fmt",
-                "s16",
-                str(dst_path),
-            ]
-            try:
-                logger.info(f"Normalizing audio via ffmpeg: {' '.join(cmd)}")
-                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                input_path = dst_path
-            except subprocess.CalledProcessError as ce:
-                logger.warning(f"ffmpeg normalization failed, proceeding with original file: {ce}")
-                # Fallback to original
-                input_path = src_path
-        else:
-            logger.info("ffmpeg not found (FFMPEG_BIN/Path); attempting to process original file as WAV")
-            input_path = src_path
+        proc.stdin.write(head)
+        await proc.stdin.drain()
+        async for chunk in chunks:
+            proc.stdin.write(chunk)
+            await proc.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # ffmpeg gave up early; its exit code carries the reason
+    finally:
+        proc.stdin.close()
 
-        # 3) Transcribe using Vosk
-        stt = VoskSTT()
-        text = stt.transcribe_wav(input_path)
-        return {"text": text}
-    except ValueError as e:
+
+async def _collect(proc: Process) -> tuple[bytes, bytes]:
+    assert proc.stdout is not None and proc.stderr is not None
+    try:
+        pcm, err = await asyncio.gather(proc.stdout.read(), proc.stderr.read())
+        await proc.wait()
+        return pcm, err
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+
+
+async def _decode(proc: Process, head: bytes, chunks: AsyncIterator[bytes]) -> tuple[bytes, bytes]:
+    feeder = asyncio.create_task(_feed_stdin(proc, head, chunks))
+    try:
+        pcm, err = await _collect(proc)
+        await feeder
+        return pcm, err
+    finally:
+        feeder.cancel()
+
+
+def _decoded(proc: Process, pcm: bytes, err: bytes) -> bool:
+    # ffmpeg can exit 0 having written nothing, e.g. "partial file" for an MP4 whose
+    # moov atom trails the data on a pipe, so the exit code alone is not enough
+    return proc.returncode == 0 and bool(pcm) and not err.strip()
+
+
+async def _decode_from_file(pool: FfmpegPool, file: UploadFile) -> tuple[Process, bytes, bytes]:
+    """Copy the upload to a named temp file and let ffmpeg read it there, where it can seek."""
+    await file.seek(0)
+
+    def spill() -> Path:
+        suffix = Path(file.filename or "audio").suffix or ".bin"
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            shutil.copyfileobj(file.file, tmp)
+        return Path(tmp.name)
+
+    path = await asyncio.to_thread(spill)
+    try:
+        proc = await pool.spawn_file(str(path))
+        pcm, err = await _collect(proc)
+        return proc, pcm, err
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def _http_error(request: Request, e: Exception) -> HTTPException:
+    if isinstance(e, ValueError):
         # Invalid WAV after best-effort. If ffmpeg isn't installed, guide user.
         msg = str(e)
-        if not (os.getenv("FFMPEG_BIN") or shutil.which("ffmpeg")):
+        if not get_ffmpeg_path(request.app):
             msg += " | Tip: install FFmpeg (winget install FFmpeg.FFmpeg) or set FFMPEG_BIN to ffmpeg.exe"
         logger.exception("STT validation error (invalid audio/WAV format)")
-        raise HTTPException(status_code=400, detail=msg)
+        return HTTPException(status_code=400, detail=msg)
+    logger.exception("STT transcription failed")
+    return HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/stt", tags=["stt"])  # /api/stt
+async def stt_transcribe(request: Request, file: UploadFile = File(...)) -> dict:
+    try:
+        stt = get_stt(request.app)
+        head = await file.read(UPLOAD_CHUNK_BYTES)
+
+        # 1) If ffmpeg is available and the upload is not already Vosk's native format, stream it
+        #    to a warm pool worker in 64 KiB chunks and get back mono 16k s16 PCM; nothing touches disk
+        pool = get_ffmpeg_pool(request.app)
+        if _is_vosk_native_wav(head):
+            logger.debug("Upload is already mono 16k s16 WAV; skipping ffmpeg")
+        elif pool:
+            # Name the demuxer from the magic bytes so ffmpeg skips autodetection
+            fmt = sniff_format(head)
+            if fmt not in SEEKABLE_FORMATS:
+                proc = await pool.acquire(fmt)
+                pcm, err = await _decode(proc, head, _upload_chunks(file))
+                if _decoded(proc, pcm, err):
+                    # Transcribe the decoded PCM using Vosk
+                    text = await asyncio.to_thread(stt.transcribe_pcm, pcm, 16000)
+                    return {"text": text}
+                logger.warning(
+                    f"ffmpeg pipe decode failed (exit {proc.returncode}, {len(pcm)} PCM bytes), retrying from a file: "
+                    f"{err.decode(errors='ignore').strip()}"
+                )
+            # MP4/M4A, or input the pipe could not handle: give ffmpeg a seekable file like before pooling
+            proc, pcm, err = await _decode_from_file(pool, file)
+            if proc.returncode == 0 and pcm:
+                text = await asyncio.to_thread(stt.transcribe_pcm, pcm, 16000)
+                return {"text": text}
+            logger.warning(
+                f"ffmpeg normalization failed (exit {proc.returncode}), proceeding with original file: "
+                f"{err.decode(errors='ignore').strip()}"
+            )
+        else:
+            logger.info("ffmpeg not found (FFMPEG_BIN/Path); attempting to process original file as WAV")
+
+        # 2) Transcribe the original upload as WAV using Vosk
+        await file.seek(0)
+        text = await asyncio.to_thread(stt.transcribe_wav, file.file)
+        return {"text": text}
     except Exception as e:
-        logger.exception("STT transcription failed")
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        try:
-            if 'src_path' in locals() and src_path.exists():
-                src_path.unlink(missing_ok=True)
-            if 'dst_path' in locals() and dst_path and dst_path.exists():
-                dst_path.unlink(missing_ok=True)
-        except Exception:
-            pass
+        raise _http_error(request, e)
+
+
+@router.post("/stt/raw", tags=["stt"])  # /api/stt/raw
+async def stt_transcribe_raw(request: Request) -> dict:
+    """Transcribe audio sent as the raw request body (e.g. Content-Type: audio/wav), no multipart parsing.
+
+    The body is streamed into ffmpeg as it arrives. Unlike /api/stt there is no
+    retry from a seekable file or as plain WAV when ffmpeg rejects the input,
+    since the body is not kept; such bodies (e.g. an MP4/M4A with its moov atom
+    at the end) get a 400.
+    """
+    try:
+        stt = get_stt(request.app)
+        chunks = request.stream()
+        head = b""
+        async for chunk in chunks:
+            head += chunk
+            if len(head) >= 64:  # enough for magic bytes and the RIFF fmt chunk
+                break
+
+        pool = get_ffmpeg_pool(request.app)
+        if pool and not _is_vosk_native_wav(head):
+            content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+            fmt = sniff_format(head) or MIME_FORMATS.get(content_type)
+            proc = await pool.acquire(fmt)
+            pcm, err = await _decode(proc, head, chunks)
+            if not _decoded(proc, pcm, err):
+                hint = " | Tip: MP4/M4A needs a seekable file; upload it to /api/stt instead" if fmt in SEEKABLE_FORMATS else ""
+                raise ValueError(
+                    f"ffmpeg could not decode the request body (exit {proc.returncode}, {len(pcm)} PCM bytes): "
+                    f"{err.decode(errors='ignore').strip()}{hint}"
+                )
+            text = await asyncio.to_thread(stt.transcribe_pcm, pcm, 16000)
+            return {"text": text}
+
+        # Already Vosk's native format (or no ffmpeg): collect the body and read it as WAV
+        body = bytearray(head)
+        async for chunk in chunks:
+            body.extend(chunk)
+        text = await asyncio.to_thread(stt.transcribe_wav, io.BytesIO(body))
+        return {"text": text}
+    except Exception as e:
+        raise _http_error(request, e)
@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 from pathlib import Path
 from typing import Optional
+from urllib.parse import quote
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from loguru import logger
 
-from ..services.tts_coqui import CoquiTTS
+from ..services.semantic_cache import get_semantic_cache
+from ..services.tts_coqui import get_tts
 
 router = APIRouter()
 
@@ -19,13 +22,41 @@ class TTSIn(BaseModel):
 
 
 @router.post("/tts", tags=["tts"], response_class=FileResponse)  # /api/tts
-async def tts_synthesize(payload: TTSIn):
+async def tts_synthesize(payload: TTSIn, request: Request):
     try:
-        tts = CoquiTTS()
-        out_path: Path = tts.synthesize_to_file(payload.text, filename=payload.filename or "tts.wav")
-        if not out_path.exists():
-            raise HTTPException(status_code=500, detail="TTS synthesis failed")
-        return FileResponse(path=str(out_path), media_type="audio/wav", filename=out_path.name)
+        tts = get_tts(request.app)
+        filename = payload.filename or "tts.wav"
+        cache = get_semantic_cache(request.app)
+        if cache:
+            vec = await asyncio.to_thread(cache.embed, payload.text)
+            hit = cache.lookup("tts", vec)
+            if hit is not None and Path(hit).exists():
+                return FileResponse(path=hit, media_type="audio/wav", filename=filename)
+        cached = tts.cached(payload.text)
+        if cached is not None:
+            if cache:
+                cache.add("tts", vec, str(cached))
+            return FileResponse(path=str(cached), media_type="audio/wav", filename=filename)
+
+        # Miss: stream sentences as they are synthesized so playback can start early.
+        # Load up front so a missing model is still reported as a 500 rather than a broken stream;
+        # the first load takes seconds, so keep it off the event loop.
+        await asyncio.to_thread(tts.load)
+
+        def stream():
+            yield from tts.synthesize_iter(payload.text)
+            # Only content-addressed cache files are stable enough to hand out for similar prompts
+            cache_path = tts.cache_path(payload.text)
+            if cache and cache_path.exists():
+                cache.add("tts", vec, str(cache_path))
+
+        # Same header FileResponse builds: RFC 5987 filename* for anything that is not plain ASCII
+        quoted = quote(filename)
+        if quoted != filename:
+            disposition = f"attachment; filename*=utf-8''{quoted}"
+        else:
+            disposition = f'attachment; filename="{filename}"'
+        return StreamingResponse(stream(), media_type="audio/wav", headers={"Content-Disposition": disposition})
     except Exception as e:
         logger.exception("TTS synthesis error")
         raise HTTPException(status_code=500, detail=str(e))
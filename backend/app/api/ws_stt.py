@@ -1,189 +1,417 @@
 from __future__ import annotations
 
-import json
-import os
-import shutil
-import subprocess
-import tempfile
-from pathlib import Path
-import threading
-import queue
+import asyncio
 import math
+import operator
+import struct
+from asyncio.subprocess import Process
+from typing import Dict, Iterator
 
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from loguru import logger
 
-from ..services.stt_vosk import VoskSTT
+from ..services.av_decoder import AvStreamDecoder, pyav_available
+from ..services.ffmpeg_pool import get_ffmpeg_pool, stream_format
+from ..services.semantic_cache import get_semantic_cache
+from ..services.stt_workers import open_recognizer
+from ..services.vad_silero import create_silero_vad
 from ..core.config import settings
 
+try:
+    import numpy as np
+except Exception:  # Optional: _rms_int16 falls back to struct on targets without NumPy
+    np = None  # type: ignore
+
+try:
+    import soxr  # type: ignore
+except Exception:  # Optional: raw PCM at other rates then goes to a recognizer at that rate
+    soxr = None  # type: ignore
+
+try:
+    import webrtcvad  # type: ignore
+except Exception:  # Optional: VADGate falls back to an RMS threshold
+    webrtcvad = None  # type: ignore
+
 router = APIRouter()
 
+# Coalesce PCM before handing it to Kaldi: up to ~500 ms of s16le per call, flushed
+# early when VAD ends a speech run or the oldest buffered byte is 300 ms old, so the
+# tail of an utterance is decoded while the caller is silent
+PCM_BATCH_MS = 500
+PCM_FLUSH_TIMEOUT = 0.3
+# How often a quiet connection checks for an aged raw batch or a throttled partial
+PCM_FLUSH_TICK = 0.1
+
+
+def _batch_bytes(sample_rate: int) -> int:
+    return sample_rate * 2 * PCM_BATCH_MS // 1000
+
+
+async def _send_json(websocket: WebSocket, payload: dict) -> None:
+    # orjson instead of stdlib json for the per-partial hot path; still a text frame,
+    # since the browser client JSON.parses text messages only
+    await websocket.send_text(orjson.dumps(payload).decode())
+
+
+# Envelope prefixes for recognizer output; Vosk already returns JSON, so it is spliced in verbatim
+RESULT_FINAL_HEAD = '{"type":"result","final":true,"result":'
+RESULT_PARTIAL_HEAD = '{"type":"result","final":false,"result":'
+FINAL_HEAD = '{"type":"final","result":'
+
+
+def _envelope(head: str, raw_result: str, prefetch: list | None = None) -> str:
+    if prefetch is None:
+        return head + raw_result + "}"
+    return head + raw_result + ',"prefetch":' + orjson.dumps({"nlp": prefetch}).decode() + "}"
+
+
+# One compiled "<Nh" decoder per frame length; VAD frames are fixed-size, so this stays tiny
+_INT16_STRUCTS: Dict[int, struct.Struct] = {}
+
+
+def _rms_int16(frame_bytes: bytes, scratch: np.ndarray | None = None) -> float:
+    """RMS of little-endian signed int16 PCM, normalised to [0, 1]."""
+    if np is None:
+        n = len(frame_bytes) // 2
+        if n == 0:
+            return 0.0
+        unpack = _INT16_STRUCTS.get(n)
+        if unpack is None:
+            unpack = _INT16_STRUCTS[n] = struct.Struct(f"<{n}h")
+        samples = unpack.unpack_from(frame_bytes)
+        return math.sqrt(sum(map(operator.mul, samples, samples)) / n) / 32768.0
+    x = np.frombuffer(frame_bytes, dtype="<i2", count=len(frame_bytes) // 2)
+    if x.size == 0:
+        return 0.0
+    # Square in float32 so int16 doesn't overflow; reuse the caller's buffer when it fits
+    if scratch is not None and scratch.size == x.size:
+        sq = np.multiply(x, x, out=scratch, dtype=np.float32)
+    else:
+        sq = np.square(x, dtype=np.float32)
+    return float(np.sqrt(np.mean(sq))) / 32768.0
+
+
+class VADGate:
+    def __init__(self, sample_rate: int) -> None:
+        self.sr = sample_rate
+        self.frame_ms = 20  # 10/20/30 allowed
+        self.bytes_per_sample = 2
+        self.frame_bytes = int(self.sr * self.frame_ms / 1000) * self.bytes_per_sample
+        self.hangover = max(0, int(settings.VAD_HANGOVER_FRAMES or 0))
+        self.countdown = 0
+        # Whether the last gated frame passed; False means a speech run just ended
+        self.in_speech = True
+        self.vad = None
+        self.silero = None
+        # Silero hysteresis: speech starts above the threshold and ends 0.15 below it
+        self.triggered = False
+        self.onset = float(settings.SILERO_VAD_THRESHOLD)
+        self.release = self.onset - 0.15
+        if settings.VAD_ENABLED and str(settings.VAD_BACKEND).lower() == "silero":
+            try:
+                self.silero = create_silero_vad(sample_rate)
+                # Silero scores fixed 32 ms windows instead of webrtcvad's 20 ms frames
+                self.frame_bytes = self.silero.window_bytes
+                logger.info(f"VAD enabled (silero, threshold={self.onset}) sr={sample_rate}")
+            except Exception as e:
+                logger.info(f"VAD fallback to webrtcvad (Silero unavailable: {e})")
+        self.scratch = np.empty(self.frame_bytes // self.bytes_per_sample, dtype=np.float32) if np is not None else None
+        # Fixed ring holding whole frames: reads always start on a frame boundary, so a
+        # frame never straddles the wrap and dequeueing is a single slice, not a memmove
+        self.ring = bytearray(self.frame_bytes * 8)
+        self.ring_mv = memoryview(self.ring)
+        self.head = 0  # write offset
+        self.tail = 0  # read offset
+        self.fill = 0
+        if settings.VAD_ENABLED and self.silero is None:
+            if webrtcvad is not None:
+                try:
+                    self.vad = webrtcvad.Vad(int(settings.VAD_AGGRESSIVENESS))
+                    logger.info(f"VAD enabled (webrtcvad, aggressiveness={int(settings.VAD_AGGRESSIVENESS)}) sr={sample_rate}")
+                except Exception:
+                    self.vad = None
+            if self.vad is None:
+                logger.info("VAD fallback to RMS threshold (webrtcvad unavailable)")
+
+    def process_segments(self, pcm_bytes: bytes) -> Iterator[bytes]:
+        """Yield runs of consecutive passing frames as one buffer each, split where frames are dropped."""
+        if not settings.VAD_ENABLED:
+            yield pcm_bytes
+            return
+        seg = bytearray()
+        for frame, keep in self._gate(pcm_bytes):
+            if keep:
+                seg.extend(frame)
+            elif seg:
+                yield bytes(seg)
+                seg.clear()
+        if seg:
+            yield bytes(seg)
+
+    def _gate(self, pcm_bytes: bytes) -> Iterator[tuple[memoryview, bool]]:
+        # Frames are views into the ring, valid only until the generator resumes
+        thr = float(settings.VAD_RMS_THRESHOLD or 0.015)
+        src = memoryview(pcm_bytes)
+        cap = len(self.ring)
+        while src:
+            # Copy what fits (two slices when it wraps), then drain every whole frame
+            n = min(len(src), cap - self.fill)
+            first = min(n, cap - self.head)
+            self.ring_mv[self.head : self.head + first] = src[:first]
+            self.ring_mv[: n - first] = src[first:n]
+            self.head = (self.head + n) % cap
+            self.fill += n
+            src = src[n:]
+            while self.fill >= self.frame_bytes:
+                frame = self.ring_mv[self.tail : self.tail + self.frame_bytes]
+                self.tail = (self.tail + self.frame_bytes) % cap
+                self.fill -= self.frame_bytes
+                if self.is_speech(frame, thr):
+                    self.countdown = self.hangover
+                    self.in_speech = True
+                elif self.countdown > 0:
+                    self.countdown -= 1
+                    self.in_speech = True
+                else:
+                    # drop non-speech
+                    self.in_speech = False
+                yield frame, self.in_speech
+
+    def is_speech(self, frame: bytes | memoryview, thr: float) -> bool:
+        if self.silero is not None:
+            prob = self.silero.speech_prob(frame)
+            if prob >= self.onset:
+                self.triggered = True
+            elif prob < self.release:
+                self.triggered = False
+            return self.triggered
+        if self.vad is not None:
+            try:
+                return self.vad.is_speech(bytes(frame), self.sr)
+            except Exception:
+                pass
+        return _rms_int16(frame, self.scratch) >= thr
+
 
 @router.websocket("/ws/stt")
 async def ws_stt(websocket: WebSocket) -> None:
     await websocket.accept()
     logger.info("WebSocket STT connection accepted")
 
-    # Prepare recognizer (16k expected if we normalize; otherwise best-effort)
-    stt = VoskSTT()
-    model = stt.get_model()
-
+    rec = None
     try:
-        # Use 16kHz target when we normalize with ffmpeg
+        # Use 16kHz target when we normalize with ffmpeg (in a worker process if STT_PROCESS_WORKERS)
         try:
-            from vosk import KaldiRecognizer  # type: ignore
+            rec = await open_recognizer(websocket.app, 16000)
         except Exception as e:  # pragma: no cover
             await websocket.close(code=1011)
             logger.exception("Vosk not available")
             return
 
-        rec = KaldiRecognizer(model, 16000)
-        rec.SetWords(True)
-        # Resolve ffmpeg path from settings/env/PATH
-        ffmpeg_path = settings.FFMPEG_BIN or os.getenv("FFMPEG_BIN") or shutil.which("ffmpeg")
-        # If FFMPEG_BIN is a directory, append the executable name
-        if ffmpeg_path and os.path.isdir(ffmpeg_path):
-            candidate = os.path.join(ffmpeg_path, "ffmpeg.exe" if os.name == "nt" else "ffmpeg")
-            if os.path.isfile(candidate):
-                ffmpeg_path = candidate
-        # If configured path is not a file, try PATH
-        if ffmpeg_path and not os.path.isfile(ffmpeg_path):
-            path_guess = shutil.which("ffmpeg")
-            if path_guess:
-                ffmpeg_path = path_guess
-        logger.info(f"FFmpeg resolved path: '{ffmpeg_path}' exists={bool(ffmpeg_path and os.path.exists(ffmpeg_path))} isfile={bool(ffmpeg_path and os.path.isfile(ffmpeg_path))}")
-        if not ffmpeg_path:
+        # Warm ffmpeg decoders are pooled at startup (None when ffmpeg wasn't found)
+        ffmpeg_pool = get_ffmpeg_pool(websocket.app)
+        use_pyav = str(settings.STT_STREAM_DECODER).lower() == "pyav" and pyav_available()
+        can_decode = ffmpeg_pool is not None or use_pyav
+        if not can_decode:
             logger.warning("ffmpeg not found (FFMPEG_BIN/Path); only raw PCM s16le will work. Install FFmpeg for broader format support.")
 
+        # Speculative NLP on partials: consult the semantic cache only (never Rasa) so that a
+        # cached reply is ready by the time the utterance is final
+        sem_cache = get_semantic_cache(websocket.app)
+        prefetched: dict[str, asyncio.Task] = {}
+        prefetch_tokens = 0
+        loop = asyncio.get_running_loop()
+        partial_interval = max(0, int(settings.STT_PARTIAL_INTERVAL_MS)) / 1000
+        last_partial = 0.0
+        pending_partial: str | None = None  # newest throttled partial, sent once the interval passes
+
+        async def prefetch(text: str) -> list | None:
+            assert sem_cache is not None
+            vec = await asyncio.to_thread(sem_cache.embed, text)
+            return sem_cache.lookup("nlp", vec)
+
+        def maybe_prefetch(partial: dict) -> None:
+            nonlocal prefetch_tokens
+            text = str(partial.get("partial") or "")
+            n_tokens = len(text.split())
+            if n_tokens < settings.STT_PREFETCH_MIN_TOKENS or n_tokens <= prefetch_tokens:
+                return
+            prefetch_tokens = n_tokens
+            prefetched[text] = asyncio.create_task(prefetch(text))
+
+        def take_prefetch(text: str) -> list | None:
+            nonlocal prefetch_tokens
+            # Exact utterance first, else the longest partial the final text extends
+            task = prefetched.get(text)
+            if task is None:
+                for partial_text, candidate in reversed(prefetched.items()):
+                    if text.startswith(partial_text):
+                        task = candidate
+                        break
+            hit = None
+            if task and task.done() and not task.cancelled() and task.exception() is None:
+                hit = task.result()
+            for pending in prefetched.values():
+                pending.cancel()
+            prefetched.clear()
+            prefetch_tokens = 0
+            return hit
+
+        async def send_pending_partial() -> None:
+            nonlocal last_partial, pending_partial
+            if pending_partial is None:
+                return
+            now = loop.time()
+            if now - last_partial >= partial_interval:
+                last_partial = now
+                raw, pending_partial = pending_partial, None
+                await websocket.send_text(_envelope(RESULT_PARTIAL_HEAD, raw))
+
+        async def accept_frame(frame: bytes) -> None:
+            nonlocal pending_partial
+            # Results are only parsed when the prefetcher needs the text
+            # Kaldi decoding is CPU-bound C; the session keeps it off the event loop
+            final, raw = await rec.accept(frame)
+            if final:
+                pending_partial = None  # superseded by the result
+                replies = take_prefetch(str(orjson.loads(raw).get("text") or "")) if sem_cache else None
+                await websocket.send_text(_envelope(RESULT_FINAL_HEAD, raw, replies))
+            else:
+                if sem_cache:
+                    maybe_prefetch(orjson.loads(raw))
+                # Throttled partials are deferred, not dropped: the newest one goes out on a later flush or tick
+                pending_partial = raw
+                await send_pending_partial()
+
         # Persistent ffmpeg pipeline
         input_mime: str | None = None
         raw_mode: bool = False
         raw_sr: int = 16000
-        ffmpeg_proc: subprocess.Popen | None = None
-        pcm_queue: "queue.Queue[bytes]" = queue.Queue()
-        stop_reader = threading.Event()
-
-        # VAD helpers
-        def _rms_int16(frame_bytes: bytes) -> float:
-            if not frame_bytes:
-                return 0.0
-            n = len(frame_bytes) // 2
-            if n == 0:
-                return 0.0
-            # Interpret as little-endian signed int16
-            total = 0.0
-            for i in range(0, len(frame_bytes), 2):
-                s = int.from_bytes(frame_bytes[i:i+2], 'little', signed=True)
-                total += (s / 32768.0) ** 2
-            return math.sqrt(total / n)
-
-        class VADGate:
-            def __init__(self, sample_rate: int) -> None:
-                self.sr = sample_rate
-                self.frame_ms = 20  # 10/20/30 allowed
-                self.bytes_per_sample = 2
-                self.frame_bytes = int(self.sr * self.frame_ms / 1000) * self.bytes_per_sample
-                self.hangover = max(0, int(settings.VAD_HANGOVER_FRAMES or 0))
-                self.countdown = 0
-                self.buf = bytearray()
-                self.vad = None
-                if settings.VAD_ENABLED:
-                    try:
-                        import webrtcvad  # type: ignore
-                        self.vad = webrtcvad.Vad(int(settings.VAD_AGGRESSIVENESS))
-                        logger.info(f"VAD enabled (webrtcvad, aggressiveness={int(settings.VAD_AGGRESSIVENESS)}) sr={sample_rate}")
-                    except Exception:
-                        self.vad = None
-                        logger.info("VAD fallback to RMS threshold (webrtcvad unavailable)")
-
-            def process(self, pcm_bytes: bytes) -> list[bytes]:
-                out: list[bytes] = []
-                if not settings.VAD_ENABLED:
-                    # pass-through
-                    out.append(pcm_bytes)
-                    return out
-                self.buf.extend(pcm_bytes)
-                thr = float(settings.VAD_RMS_THRESHOLD or 0.015)
-                while len(self.buf) >= self.frame_bytes:
-                    frame = bytes(self.buf[: self.frame_bytes])
-                    del self.buf[: self.frame_bytes]
-                    is_speech = False
-                    if self.vad is not None:
-                        try:
-                            is_speech = self.vad.is_speech(frame, self.sr)
-                        except Exception:
-                            is_speech = _rms_int16(frame) >= thr
-                    else:
-                        is_speech = _rms_int16(frame) >= thr
-                    if is_speech:
-                        self.countdown = self.hangover
-                        out.append(frame)
-                    elif self.countdown > 0:
-                        self.countdown -= 1
-                        out.append(frame)
-                    else:
-                        # drop non-speech
-                        pass
-                return out
-
-        def start_ffmpeg(mime: str) -> subprocess.Popen:
-            # Use matroska demuxer for webm streams; ogg for OGG/Opus
-            fmt = "matroska" if "webm" in mime else ("ogg" if "ogg" in mime else "matroska")
-            cmd = [
-                ffmpeg_path,
-                "-hide_banner",
-                "-loglevel",
-                "error",
-                "-fflags", "+genpts",
-                "-analyzeduration", "0",
-                "-probesize", "32k",
-                "-flags", "low_delay",
-                "-fflags", "+nobuffer",
-                "-f",
-                fmt,
-                "-i",
-                "pipe:0",
-                "-ac",
-                "1",
-                "-ar",
-                "16000",
-                "-f",
-                "s16le",
-                "pipe:1",
-            ]
-            logger.info(f"Launching ffmpeg streaming pipeline: {' '.join(cmd)}")
-            return subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                bufsize=0,
-            )
-
-        def reader_thread(proc: subprocess.Popen):
-            try:
-                assert proc.stdout is not None
-                while not stop_reader.is_set():
-                    chunk = proc.stdout.read(4096)
-                    if not chunk:
-                        break
-                    pcm_queue.put(chunk)
-            except Exception as e:
-                logger.debug(f"ffmpeg reader thread terminated: {e}")
+        feed_sr: int = 16000  # rate after optional resampling, i.e. what VAD and the recognizer see
+        resampler = None
+        raw_batch = bytearray()
+        raw_batch_started = 0.0
+        ffmpeg_proc: Process | AvStreamDecoder | None = None
+
+        async def start_ffmpeg(mime: str) -> Process | AvStreamDecoder:
+            fmt = stream_format(mime)
+            if use_pyav:
+                # Decode in-process: no pipe round trip through a child process
+                logger.info(f"Starting in-process PyAV decoder (format={fmt})")
+                return AvStreamDecoder(fmt)
+            assert ffmpeg_pool is not None
+            logger.info(f"Using pooled ffmpeg streaming pipeline (format={fmt})")
+            return await ffmpeg_pool.acquire_stream(mime)
 
-        def stderr_thread(proc: subprocess.Popen):
+        async def pump_pcm(proc: Process | AvStreamDecoder) -> None:
+            # Feed recognizer as soon as ffmpeg emits PCM, independent of inbound websocket cadence
+            assert proc.stdout is not None
+            vad_gate_ff = VADGate(16000)
+            batch = bytearray()
+            batch_started = 0.0
+            while True:
+                try:
+                    pcm: bytes | None = await asyncio.wait_for(proc.stdout.read(4096), timeout=PCM_FLUSH_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pcm = None  # idle; flush whatever is pending
+                if pcm == b"":
+                    break
+                try:
+                    if pcm:
+                        for segment in vad_gate_ff.process_segments(pcm):
+                            if not batch:
+                                batch_started = loop.time()
+                            batch.extend(segment)
+                    if batch and (
+                        pcm is None
+                        or not vad_gate_ff.in_speech
+                        or len(batch) >= _batch_bytes(16000)
+                        or loop.time() - batch_started >= PCM_FLUSH_TIMEOUT
+                    ):
+                        await accept_frame(bytes(batch))
+                        batch.clear()
+                except Exception as e:
+                    logger.warning(f"Recognizer error: {e}")
+            if batch:
+                try:
+                    await accept_frame(bytes(batch))
+                except Exception as e:
+                    logger.warning(f"Recognizer error: {e}")
+
+        async def drain_stderr(proc: Process | AvStreamDecoder) -> None:
             try:
                 assert proc.stderr is not None
-                while not stop_reader.is_set():
-                    line = proc.stderr.readline()
+                while True:
+                    line = await proc.stderr.readline()
                     if not line:
                         break
-                    logger.info(f"ffmpeg: {line.decode(errors='ignore').strip()}")
+                    # Per-line decoder chatter: DEBUG, and only decoded when that level is emitted
+                    logger.opt(lazy=True).debug("ffmpeg: {}", lambda: line.decode(errors="ignore").strip())
             except Exception:
                 pass
 
-        reader: threading.Thread | None = None
-        err_reader: threading.Thread | None = None
+        def gate_raw(pcm: bytes) -> None:
+            nonlocal raw_batch_started
+            for segment in vad_gate.process_segments(pcm):
+                if not raw_batch:
+                    raw_batch_started = loop.time()
+                raw_batch.extend(segment)
+
+        async def flush_raw_batch() -> None:
+            # Snapshot before awaiting so a concurrent flush can't feed the same bytes twice
+            if raw_batch:
+                frame = bytes(raw_batch)
+                raw_batch.clear()
+                await accept_frame(frame)
+
+        finishing = asyncio.Event()  # set on "final": stops the idle flusher without waiting out a tick
+
+        async def flush_idle() -> None:
+            # Timer side of batching: while the client is quiet nothing else would flush
+            while True:
+                try:
+                    await asyncio.wait_for(finishing.wait(), timeout=PCM_FLUSH_TICK)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    if raw_batch and loop.time() - raw_batch_started >= PCM_FLUSH_TIMEOUT:
+                        await flush_raw_batch()
+                    await send_pending_partial()
+                except Exception as e:
+                    logger.warning(f"Recognizer error: {e}")
+
+        pump_task: asyncio.Task | None = None
+        err_task: asyncio.Task | None = None
+
+        async def ensure_ffmpeg(mime: str) -> bool:
+            """Start the decoder and its reader tasks once per connection; False (client told) on failure."""
+            nonlocal ffmpeg_proc, pump_task, err_task
+            if ffmpeg_proc is not None:
+                return True
+            try:
+                ffmpeg_proc = await start_ffmpeg(mime)
+            except Exception as e:
+                logger.exception("Failed to start ffmpeg pipeline")
+                await _send_json(websocket, {"type": "error", "message": f"Failed to start FFmpeg: {e}"})
+                return False
+            pump_task = asyncio.create_task(pump_pcm(ffmpeg_proc))
+            err_task = asyncio.create_task(drain_stderr(ffmpeg_proc))
+            return True
+
+        async def release_decoder() -> None:
+            # Wait for the readers to unwind first: a decoder handed back to the spares must
+            # not still have a cancelled read() pending on its stdout/stderr
+            await asyncio.gather(*(t for t in (pump_task, err_task, flush_task) if t), return_exceptions=True)
+            if isinstance(ffmpeg_proc, AvStreamDecoder):
+                ffmpeg_proc.terminate()
+            elif ffmpeg_proc and ffmpeg_pool:
+                await ffmpeg_pool.release_or_drain(ffmpeg_proc, used=ffmpeg_fed)
+
+        logged_chunks = 0
+        ffmpeg_fed = False  # an untouched pooled decoder can go back to the spares
+        flush_task = asyncio.create_task(flush_idle())
 
         while True:
             try:
@@ -202,7 +430,7 @@ async def ws_stt(websocket: WebSocket) -> None:
                 raw_text = str(message["text"]).strip()
                 # Try JSON init
                 try:
-                    msg = json.loads(raw_text)
+                    msg = orjson.loads(raw_text)
                     if isinstance(msg, dict) and msg.get("type") == "init":
                         # raw PCM path
                         mode = str(msg.get("mode") or "").lower()
@@ -212,33 +440,29 @@ async def ws_stt(websocket: WebSocket) -> None:
                                 raw_sr = int(msg.get("sampleRate") or 16000)
                             except Exception:
                                 raw_sr = 16000
-                            # Recreate recognizer with requested sample rate
-                            try:
-                                rec = KaldiRecognizer(model, raw_sr)
-                                rec.SetWords(True)
-                            except Exception as e:
-                                logger.exception("Failed to set recognizer sample rate")
-                            logger.info(f"Client init raw PCM mode sampleRate={raw_sr}")
+                            if raw_sr != 16000 and soxr is not None and np is not None:
+                                # Resample to Vosk's native 16 kHz and keep the default recognizer
+                                resampler = soxr.ResampleStream(raw_sr, 16000, 1, dtype="int16", quality="HQ")
+                                feed_sr = 16000
+                            else:
+                                # Recreate recognizer with requested sample rate
+                                try:
+                                    new_rec = await open_recognizer(websocket.app, raw_sr)
+                                    await rec.close()
+                                    rec = new_rec
+                                except Exception as e:
+                                    logger.exception("Failed to set recognizer sample rate")
+                                feed_sr = raw_sr
+                            logger.info(f"Client init raw PCM mode sampleRate={raw_sr}{' (soxr -> 16000)' if resampler else ''}")
                             # Initialize VAD gate for raw stream
-                            vad_gate = VADGate(raw_sr)
+                            vad_gate = VADGate(feed_sr)
                             continue
 
                         input_mime = str(msg.get("mimeType") or "")
                         logger.info(f"Client init mimeType='{input_mime}'")
                         # Start ffmpeg now if available and not started
-                        if ffmpeg_path and ffmpeg_proc is None:
-                            try:
-                                ffmpeg_proc = start_ffmpeg(input_mime)
-                                reader = threading.Thread(target=reader_thread, args=(ffmpeg_proc,), daemon=True)
-                                reader.start()
-                                err_reader = threading.Thread(target=stderr_thread, args=(ffmpeg_proc,), daemon=True)
-                                err_reader.start()
-                            except Exception as e:
-                                logger.exception("Failed to start ffmpeg pipeline")
-                                await websocket.send_json({
-                                    "type": "error",
-                                    "message": f"Failed to start FFmpeg: {e}"
-                                })
+                        if can_decode:
+                            await ensure_ffmpeg(input_mime)
                             continue
                 except Exception:
                     # Not JSON, treat as control
@@ -247,8 +471,23 @@ async def ws_stt(websocket: WebSocket) -> None:
                 text_msg = raw_text.lower()
                 if text_msg in {"close", "stop", "final"}:
                     try:
-                        final = json.loads(rec.FinalResult())
-                        await websocket.send_json({"type": "final", "result": final})
+                        # Let the idle flusher finish its current step so it can't race the final result
+                        finishing.set()
+                        await flush_task
+                        # Let ffmpeg flush buffered audio through the recognizer before finalizing
+                        if ffmpeg_proc and ffmpeg_proc.stdin and pump_task and ffmpeg_fed:
+                            ffmpeg_proc.stdin.close()
+                            try:
+                                await asyncio.wait_for(pump_task, timeout=2.0)
+                            except asyncio.TimeoutError:
+                                pass
+                        if resampler is not None:
+                            tail = resampler.resample_chunk(np.zeros(0, dtype=np.int16), last=True)
+                            gate_raw(tail.tobytes())
+                        await flush_raw_batch()
+                        raw = await rec.final()
+                        replies = take_prefetch(str(orjson.loads(raw).get("text") or "")) if sem_cache else None
+                        await websocket.send_text(_envelope(FINAL_HEAD, raw, replies))
                     except Exception:
                         pass
                     finally:
@@ -269,25 +508,24 @@ async def ws_stt(websocket: WebSocket) -> None:
             # If raw mode, feed bytes directly as PCM16LE with VAD gating
             if raw_mode:
                 try:
-                    # Gate with VAD
-                    gated_frames = vad_gate.process(chunk) if settings.VAD_ENABLED else [chunk]
-                    for frame in gated_frames:
-                        if not frame:
-                            continue
-                        if rec.AcceptWaveform(frame):
-                            result = json.loads(rec.Result())
-                            await websocket.send_json({"type": "result", "final": True, "result": result})
-                        else:
-                            partial = json.loads(rec.PartialResult())
-                            await websocket.send_json({"type": "result", "final": False, "result": partial})
+                    if resampler is not None:
+                        chunk = resampler.resample_chunk(np.frombuffer(chunk, dtype="<i2")).tobytes()
+                    # Gate with VAD; flush at a full batch, at the end of a speech run, or once it ages out
+                    gate_raw(chunk)
+                    if raw_batch and (
+                        not vad_gate.in_speech
+                        or len(raw_batch) >= _batch_bytes(feed_sr)
+                        or loop.time() - raw_batch_started >= PCM_FLUSH_TIMEOUT
+                    ):
+                        await flush_raw_batch()
                 except Exception as e:
                     logger.warning(f"Recognizer error (raw): {e}")
                 continue
 
             # If ffmpeg not available, cannot decode compressed formats reliably
-            if not ffmpeg_path:
+            if not can_decode:
                 try:
-                    await websocket.send_json({
+                    await _send_json(websocket, {
                         "type": "error",
                         "message": "FFmpeg not found. Install it or set FFMPEG_BIN to decode browser audio."
                     })
@@ -295,46 +533,32 @@ async def ws_stt(websocket: WebSocket) -> None:
                     pass
                 continue
 
-            # Ensure ffmpeg pipeline started after receiving init
+            # Normally started on init; only retried here if that failed
             if ffmpeg_proc is None:
-                if input_mime:
-                    try:
-                        ffmpeg_proc = start_ffmpeg(input_mime)
-                        reader = threading.Thread(target=reader_thread, args=(ffmpeg_proc,), daemon=True)
-                        reader.start()
-                        err_reader = threading.Thread(target=stderr_thread, args=(ffmpeg_proc,), daemon=True)
-                        err_reader.start()
-                    except Exception as e:
-                        logger.exception("Failed to start ffmpeg pipeline")
-                        await websocket.send_json({"type": "error", "message": f"Failed to start FFmpeg: {e}"})
-                        continue
-                else:
+                if not input_mime:
                     # Ask client to send init first
                     try:
-                        await websocket.send_json({"type": "error", "message": "Send init with mimeType before audio"})
+                        await _send_json(websocket, {"type": "error", "message": "Send init with mimeType before audio"})
                     except Exception:
                         pass
                     continue
+                if not await ensure_ffmpeg(input_mime):
+                    continue
 
             # Write compressed chunk to ffmpeg stdin
             try:
                 assert ffmpeg_proc and ffmpeg_proc.stdin
-                # Optionally log size of compressed chunk (first few only)
-                try:
-                    if getattr(ws_stt, "_logged_chunks", 0) < 5:
-                        logger.info(f"WS chunk bytes={len(chunk)}")
-                        setattr(ws_stt, "_logged_chunks", getattr(ws_stt, "_logged_chunks", 0) + 1)
-                except Exception:
-                    pass
+                # Log size of compressed chunk (first few per connection only)
+                if logged_chunks < 5:
+                    logger.info(f"WS chunk bytes={len(chunk)}")
+                    logged_chunks += 1
                 ffmpeg_proc.stdin.write(chunk)
-                try:
-                    ffmpeg_proc.stdin.flush()
-                except Exception:
-                    pass
+                ffmpeg_fed = True
+                await ffmpeg_proc.stdin.drain()
                 # Detect unexpected ffmpeg termination early
-                if ffmpeg_proc.poll() is not None:
+                if ffmpeg_proc.returncode is not None:
                     try:
-                        await websocket.send_json({
+                        await _send_json(websocket, {
                             "type": "error",
                             "message": "FFmpeg exited unexpectedly. Check logs and mimeType compatibility."
                         })
@@ -345,31 +569,6 @@ async def ws_stt(websocket: WebSocket) -> None:
                 logger.warning(f"ffmpeg stdin write failed: {e}")
                 continue
 
-            # Drain available PCM from queue and feed recognizer
-            try:
-                drained = False
-                while not pcm_queue.empty():
-                    drained = True
-                    pcm = pcm_queue.get()
-                    # Initialize VAD for ffmpeg path at 16k
-                    if 'vad_gate_ff' not in locals():
-                        vad_gate_ff = VADGate(16000)
-                    gated_frames = vad_gate_ff.process(pcm) if settings.VAD_ENABLED else [pcm]
-                    for frame in gated_frames:
-                        if not frame:
-                            continue
-                        if rec.AcceptWaveform(frame):
-                            result = json.loads(rec.Result())
-                            await websocket.send_json({"type": "result", "final": True, "result": result})
-                        else:
-                            partial = json.loads(rec.PartialResult())
-                            await websocket.send_json({"type": "result", "final": False, "result": partial})
-                if not drained:
-                    # No PCM yet; continue receiving
-                    pass
-            except Exception as e:
-                logger.warning(f"Recognizer error: {e}")
-
     except Exception:
         logger.exception("WebSocket STT error")
         try:
@@ -379,16 +578,22 @@ async def ws_stt(websocket: WebSocket) -> None:
     finally:
         # Cleanup ffmpeg resources
         try:
-            stop_reader.set()
+            for task in (pump_task, err_task, flush_task, *prefetched.values()):
+                if task and not task.done():
+                    task.cancel()
         except Exception:
             pass
         try:
-            if ffmpeg_proc and ffmpeg_proc.stdin:
-                ffmpeg_proc.stdin.close()
-        except Exception:
-            pass
-        try:
-            if ffmpeg_proc and ffmpeg_proc.poll() is None:
-                ffmpeg_proc.terminate()
+            # Shielded: the server may cancel this handler once the socket is closed, and
+            # the decoder still has to go back to the pool or be reaped
+            await asyncio.shield(release_decoder())
         except Exception:
             pass
+        finally:
+            # Its own finally: a cancelled shield raises CancelledError, and a worker-process
+            # session would otherwise keep its recognizer allocated
+            try:
+                if rec:
+                    await rec.close()
+            except Exception:
+                pass
@@ -5,6 +5,14 @@ class Settings(BaseSettings):
     # App
     PORT: int = 5000
     MODE: str = "development"
+    # Server tuning, applied by gunicorn.conf.py; with plain uvicorn pass the equivalent
+    # `--loop uvloop --ws-per-message-deflate false`.
+    # uvloop ("auto" picks it when installed, as uvicorn[standard] does off Windows) cuts per-frame
+    # overhead for the many small /ws/stt messages. permessage-deflate stays off: webm/ogg audio is
+    # already compressed and PCM barely shrinks, so it burns CPU on every frame; the price is a few
+    # uncompressed bytes on the JSON result messages.
+    SERVER_LOOP: str = "auto"  # "auto", "uvloop" or "asyncio"
+    WS_PER_MESSAGE_DEFLATE: bool = False
 
     # CORS / Frontend
     FRONTEND_URL: str = "http://localhost:3000"
@@ -19,15 +27,31 @@ class Settings(BaseSettings):
     # NLP (Rasa)
     RASA_URL: str = "http://localhost:5005"
 
+    # Semantic response cache for /api/tts and /api/nlp (needs sentence-transformers + faiss-cpu).
+    # Off by default: a hit returns the answer cached for a *similar* prompt, which ignores Rasa
+    # conversation state, so only enable it for stateless prompt sets.
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # minimum cosine similarity for a hit
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2048  # per namespace, oldest evicted first
+    STT_PREFETCH_MIN_TOKENS: int = 3  # partial length (words) before /ws/stt probes the cache for a reply
+
     # Media tools
     FFMPEG_BIN: str | None = None  # e.g., C:\ffmpeg\...\bin\ffmpeg.exe
+    STT_STREAM_DECODER: str = "ffmpeg"  # /ws/stt decoder: "ffmpeg" (subprocess) or "pyav" (in-process, needs av)
     VOSK_MODEL_DIR: str | None = None  # e.g., C:\path\to\vosk\model
+    STT_PROCESS_WORKERS: int = 0  # /ws/stt recognizers in N worker processes (one model copy each); 0 = in-process threads
+    STT_PARTIAL_INTERVAL_MS: int = 250  # min gap between partial results sent on /ws/stt; finals are never held back
+    TTS_CACHE_MAX_FILES: int = 512  # synthesized WAVs kept on disk (LRU); 0 disables the cache
 
     # Audio / VAD
     VAD_ENABLED: bool = True  # enable server-side gating
     VAD_AGGRESSIVENESS: int = 2  # 0..3 (3 = most aggressive)
     VAD_RMS_THRESHOLD: float = 0.015  # fallback RMS threshold if webrtcvad unavailable
     VAD_HANGOVER_FRAMES: int = 8  # continue passing N frames after speech ends
+    VAD_BACKEND: str = "webrtc"  # "webrtc" or "silero" (needs onnxruntime + SILERO_VAD_MODEL)
+    SILERO_VAD_MODEL: str | None = None  # path to silero_vad.onnx (v4 or v5 export)
+    SILERO_VAD_THRESHOLD: float = 0.5  # speech onset probability; released below threshold - 0.15
 
     model_config = SettingsConfigDict(
         env_file=".env",
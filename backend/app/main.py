@@ -2,6 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
 from .db.mongo import connect_to_mongo, close_mongo_connection
+from .services.ffmpeg_pool import start_ffmpeg_pool, stop_ffmpeg_pool
+from .services.nlp_rasa import connect_to_rasa, close_rasa_connection
+from .services.semantic_cache import load_semantic_cache
+from .services.stt_vosk import load_stt, preload_stt
+from .services.stt_workers import start_stt_workers, stop_stt_workers
+from .services.tts_coqui import load_tts
 from .api.health import router as health_router
 from .api.db import router as db_router
 from .api.stt import router as stt_router
@@ -9,6 +15,9 @@ from .api.tts import router as tts_router
 from .api.nlp import router as nlp_router
 from .api.ws_stt import router as ws_stt_router
 
+# Load the Vosk model at import, before any worker fork (see gunicorn.conf.py)
+preload_stt()
+
 app = FastAPI(title="Callbot Backend", version="0.1.0")
 
 # CORS
@@ -41,8 +50,17 @@ app.include_router(ws_stt_router)
 @app.on_event("startup")
 async def on_startup() -> None:
     await connect_to_mongo(app)
+    await connect_to_rasa(app)
+    await start_ffmpeg_pool(app)
+    await load_stt(app)
+    await start_stt_workers(app)
+    await load_semantic_cache(app)
+    await load_tts(app)
 
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
+    await stop_stt_workers(app)
+    await stop_ffmpeg_pool(app)
+    await close_rasa_connection(app)
     await close_mongo_connection(app)
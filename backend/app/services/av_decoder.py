@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import queue
+import threading
+
+try:
+    import av  # type: ignore
+except Exception:  # Optional: only needed when STT_STREAM_DECODER=pyav
+    av = None  # type: ignore
+
+
+def pyav_available() -> bool:
+    return av is not None
+
+
+class _Feed(io.RawIOBase):
+    """Blocking file-like over chunks handed in from the event loop; libav reads it on the decoder thread."""
+
+    def __init__(self) -> None:
+        self._chunks: "queue.Queue[bytes | None]" = queue.Queue()
+        self._pending = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._pending:
+            if self._eof:
+                return 0
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def put(self, chunk: bytes | None) -> None:
+        self._chunks.put(chunk)
+
+
+class _Stdin:
+    def __init__(self, feed: _Feed) -> None:
+        self._feed = feed
+        self._closed = False
+
+    def write(self, data: bytes) -> None:
+        if not self._closed and data:
+            self._feed.put(bytes(data))
+
+    async def drain(self) -> None:
+        # Writes only enqueue; there is no pipe to wait on
+        return None
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._feed.put(None)
+
+
+class AvStreamDecoder:
+    """In-process replacement for the streaming ffmpeg subprocess, decoding with PyAV (libav).
+
+    Mirrors the parts of ``asyncio.subprocess.Process`` that /ws/stt uses:
+    compressed audio goes in through ``stdin.write()``/``close()``, mono 16 kHz
+    s16le PCM comes out of the ``stdout`` StreamReader, and decode errors are
+    reported on ``stderr``. libav's reads block, so demuxing runs on one daemon
+    thread that hands PCM back with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, fmt: str, limit: int = 1 << 20) -> None:
+        if av is None:
+            raise RuntimeError("PyAV is not installed. Install with: python -m pip install av")
+        self.fmt = fmt
+        self.returncode: int | None = None
+        self._loop = asyncio.get_running_loop()
+        self._feed = _Feed()
+        self.stdin = _Stdin(self._feed)
+        self.stdout = asyncio.StreamReader(limit=limit)
+        self.stderr = asyncio.StreamReader()
+        self._thread = threading.Thread(target=self._run, name=f"av-decode-{fmt}", daemon=True)
+        self._thread.start()
+
+    def _emit(self, reader: asyncio.StreamReader, data: bytes) -> None:
+        self._call(reader.feed_data, data)
+
+    def _finish(self, returncode: int) -> None:
+        def done() -> None:
+            self.returncode = returncode
+            self.stdout.feed_eof()
+            self.stderr.feed_eof()
+
+        self._call(done)
+
+    def _call(self, fn, *args) -> None:
+        try:
+            self._loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass  # event loop already closed (server shutdown); nobody is reading any more
+
+    def _run(self) -> None:
+        returncode = 0
+        try:
+            container = av.open(
+                self._feed,
+                mode="r",
+                format=self.fmt,
+                options={"probesize": "32", "analyzeduration": "0", "fflags": "+genpts"},
+            )
+            with container:
+                resampler = av.AudioResampler(format="s16", layout="mono", rate=16000)
+                for frame in container.decode(audio=0):
+                    for out in resampler.resample(frame):
+                        self._emit(self.stdout, out.to_ndarray().tobytes())
+                for out in resampler.resample(None):
+                    self._emit(self.stdout, out.to_ndarray().tobytes())
+        except Exception as e:
+            returncode = 1
+            # Unblock the event loop side if it is still writing
+            self.stdin.close()
+            self._emit(self.stderr, f"{e}\n".encode())
+        finally:
+            self._finish(returncode)
+
+    def terminate(self) -> None:
+        # Ends the input; the decoder thread finishes the buffered tail and exits
+        self.stdin.close()
+
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import shutil
+from asyncio.subprocess import DEVNULL, PIPE, Process
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import FastAPI
+from loguru import logger
+
+from ..core.config import settings
+
+
+FFMPEG_POOL_KEY = "ffmpeg_pool"
+FFMPEG_PATH_KEY = "ffmpeg_path"
+
+
+@functools.lru_cache(maxsize=1)
+def find_ffmpeg() -> str | None:
+    # shutil.which walks PATH with a stat per entry; resolve once per process
+    ffmpeg_path = settings.FFMPEG_BIN or os.getenv("FFMPEG_BIN") or shutil.which("ffmpeg")
+    # If FFMPEG_BIN is a directory, append the executable name
+    if ffmpeg_path and os.path.isdir(ffmpeg_path):
+        candidate = os.path.join(ffmpeg_path, "ffmpeg.exe" if os.name == "nt" else "ffmpeg")
+        if os.path.isfile(candidate):
+            ffmpeg_path = candidate
+    # If configured path is not a file, try PATH
+    if ffmpeg_path and not os.path.isfile(ffmpeg_path):
+        ffmpeg_path = shutil.which("ffmpeg")
+    return ffmpeg_path
+
+
+def sniff_format(head: bytes) -> str | None:
+    """Map the leading magic bytes of an upload to an ffmpeg demuxer name; None lets ffmpeg autoprobe."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "matroska"  # also covers webm
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "mov"  # mp4/m4a family
+    if head[:3] == b"ID3":
+        return "mp3"
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # MPEG frame sync; layer bits 00 mean ADTS AAC rather than MP3
+        return "aac" if head[1] & 0x06 == 0 else "mp3"
+    return None
+
+
+# Demuxers that need to seek: MP4/M4A usually keep the moov index after the audio data
+# (ffmpeg's and most phone recorders' default), which a pipe can't seek back to
+SEEKABLE_FORMATS = {"mov"}
+
+
+def stream_format(mime: str) -> str:
+    # Use matroska demuxer for webm streams; ogg for OGG/Opus
+    return "matroska" if "webm" in mime else ("ogg" if "ogg" in mime else "matroska")
+
+
+# Decoders warmed at startup: the upload formats sniff_format sees most, plus the /ws/stt
+# stream demuxers. Anything else (including autoprobe) spawns on first use, then refills.
+WARM_KEYS: List[Tuple[Optional[str], bool]] = [
+    ("wav", False),
+    ("ogg", False),
+    ("matroska", False),
+    ("mp3", False),
+    ("matroska", True),
+    ("ogg", True),
+]
+
+
+class FfmpegPool:
+    """Warm ffmpeg decoders that read compressed audio on stdin and emit mono 16k s16le PCM on stdout.
+
+    ffmpeg exits once stdin reaches EOF, so every process decodes exactly one
+    stream. The pool keeps up to ``size`` spares per input format launched
+    ahead of time and starts a replacement in the background when one is
+    handed out and the format is below ``size``, which keeps process creation
+    off the request path. One spare per ``WARM_KEYS`` entry is launched at
+    startup; other formats warm up the first time they are requested. Live
+    /ws/stt streams (``stream=True``) get their own spares with low-latency
+    demuxer flags.
+
+    Every gunicorn worker runs its own pool, so an idle host holds
+    ``len(WARM_KEYS)`` (6) ffmpeg processes per worker, i.e. about 6 x
+    WEB_CONCURRENCY (cpu_count by default), and never more than ``size`` per
+    format per worker.
+
+    Uploads are decoded from ``pipe:0`` with the demuxer sniffed from their
+    magic bytes. The exception is ``SEEKABLE_FORMATS`` (MP4/M4A), whose index
+    may trail the audio: those go through ``spawn_file`` on a temp copy instead.
+    """
+
+    def __init__(self, ffmpeg_path: str, size: int = 2) -> None:
+        self.ffmpeg_path = ffmpeg_path
+        # Per format, not per core: every gunicorn worker runs its own pool
+        self.size = max(1, size)
+        self._spares: Dict[Tuple[Optional[str], bool], "asyncio.Queue[Process]"] = {}
+        self._leased: Dict[Process, Tuple[Optional[str], bool]] = {}
+        self._refills: Set[asyncio.Task] = set()
+        self._refilling: Dict[Tuple[Optional[str], bool], int] = {}
+        self._closed = False
+
+    def command(self, fmt: str | None = None, stream: bool = False, source: str = "pipe:0") -> List[str]:
+        # With the demuxer known up front, skip probing and start decoding on the first packet.
+        # Uploads skip -fflags +nobuffer: it discards the probed packets, i.e. the start of the
+        # file. Live streams trickle in, so nothing is lost there and latency matters more.
+        fflags = ["-fflags", "+genpts+nobuffer"] if stream else []
+        demuxer = ["-probesize", "32", "-analyzeduration", "0", "-flags", "low_delay", *fflags, "-f", fmt] if fmt else []
+        return [
+            self.ffmpeg_path,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            *demuxer,
+            "-i",
+            source,
+            "-ac",
+            "1",
+            "-ar",
+            "16000",
+            "-acodec",
+            "pcm_s16le",
+            "-f",
+            "s16le",
+            "pipe:1",
+        ]
+
+    def _queue(self, key: Tuple[Optional[str], bool]) -> "asyncio.Queue[Process]":
+        return self._spares.setdefault(key, asyncio.Queue())
+
+    async def _spawn(self, key: Tuple[Optional[str], bool] = (None, False)) -> Process:
+        # 1 MiB StreamReader buffer so a burst of decoded PCM never pauses ffmpeg's stdout
+        return await asyncio.create_subprocess_exec(
+            *self.command(*key), stdin=PIPE, stdout=PIPE, stderr=PIPE, limit=1 << 20
+        )
+
+    def _schedule_refill(self, key: Tuple[Optional[str], bool]) -> None:
+        # Count spawns already in flight, so a format is never topped up past size
+        if self._closed or self._queue(key).qsize() + self._refilling.get(key, 0) >= self.size:
+            return
+        self._refilling[key] = self._refilling.get(key, 0) + 1
+        task = asyncio.create_task(self._refill(key))
+        self._refills.add(task)
+        task.add_done_callback(self._refills.discard)
+
+    async def _refill(self, key: Tuple[Optional[str], bool]) -> None:
+        try:
+            proc = await self._spawn(key)
+        except Exception as e:
+            logger.warning(f"ffmpeg pool refill failed: {e}")
+            return
+        finally:
+            self._refilling[key] -= 1
+        if not self._put_back(key, proc):
+            await _discard(proc)
+
+    def _put_back(self, key: Tuple[Optional[str], bool], proc: Process) -> bool:
+        spares = self._queue(key)
+        if self._closed or spares.qsize() >= self.size or proc.returncode is not None:
+            return False
+        spares.put_nowait(proc)
+        return True
+
+    async def start(self) -> None:
+        for key in WARM_KEYS:
+            self._queue(key).put_nowait(await self._spawn(key))
+        logger.info(f"ffmpeg pool ready with {len(WARM_KEYS)} warm decoder(s)")
+
+    async def acquire(self, fmt: str | None = None, stream: bool = False) -> Process:
+        key = (fmt, stream)
+        spares = self._queue(key)
+        proc = None
+        while proc is None and not spares.empty():
+            proc = spares.get_nowait()
+            if proc.returncode is not None:
+                proc = None
+        self._schedule_refill(key)
+        # Every spare is busy; pay the spawn cost inline rather than queueing the request
+        proc = proc or await self._spawn(key)
+        if stream:
+            self._leased[proc] = key
+        return proc
+
+    async def spawn_file(self, path: str) -> Process:
+        """Unpooled decoder reading ``path`` itself, for inputs that need a seekable source; stdin unused."""
+        return await asyncio.create_subprocess_exec(
+            *self.command(source=path), stdin=DEVNULL, stdout=PIPE, stderr=PIPE, limit=1 << 20
+        )
+
+    async def acquire_stream(self, mime: str) -> Process:
+        """Decoder for a live /ws/stt stream; hand it back with release_or_drain()."""
+        return await self.acquire(stream_format(mime), stream=True)
+
+    async def release_or_drain(self, proc: Process, used: bool = True) -> None:
+        """Return a stream decoder that was never fed to the spares; otherwise let it finish and reap it."""
+        key = self._leased.pop(proc, None)
+        if not used and key is not None and self._put_back(key, proc):
+            return
+        try:
+            if proc.stdin and not proc.stdin.is_closing():
+                proc.stdin.close()
+            # ffmpeg exits on stdin EOF once it has flushed; don't leave a zombie if it hangs
+            await asyncio.wait_for(proc.wait(), timeout=1.0)
+        except Exception:
+            await _discard(proc)
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in list(self._refills):
+            task.cancel()
+        for spares in self._spares.values():
+            while not spares.empty():
+                await _discard(spares.get_nowait())
+        for proc in list(self._leased):
+            await _discard(proc)
+        self._leased.clear()
+
+
+async def _discard(proc: Process) -> None:
+    try:
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+    except Exception:
+        pass
+
+
+async def start_ffmpeg_pool(app: FastAPI) -> None:
+    pool: Optional[FfmpegPool] = None
+    ffmpeg_path = find_ffmpeg()
+    app.state.__setattr__(FFMPEG_PATH_KEY, ffmpeg_path)
+    logger.info(f"FFmpeg resolved path: '{ffmpeg_path}'")
+    if ffmpeg_path:
+        pool = FfmpegPool(ffmpeg_path)
+        try:
+            await pool.start()
+        except Exception as e:
+            logger.warning(f"Could not start ffmpeg pool with '{ffmpeg_path}': {e}")
+            await pool.close()
+            pool = None
+    else:
+        logger.info("ffmpeg not found (FFMPEG_BIN/Path); ffmpeg pool disabled")
+    app.state.__setattr__(FFMPEG_POOL_KEY, pool)
+
+
+async def stop_ffmpeg_pool(app: FastAPI) -> None:
+    pool: FfmpegPool | None = getattr(app.state, FFMPEG_POOL_KEY, None)
+    if pool:
+        await pool.close()
+
+
+def get_ffmpeg_pool(app: FastAPI) -> FfmpegPool | None:
+    return getattr(app.state, FFMPEG_POOL_KEY, None)
+
+
+def get_ffmpeg_path(app: FastAPI) -> str | None:
+    return getattr(app.state, FFMPEG_PATH_KEY, None)
@@ -3,23 +3,49 @@ from __future__ import annotations
 from typing import Any, Dict, List
 
 import httpx
+from fastapi import FastAPI
 from loguru import logger
 
 from ..core.config import settings
 
 
+RASA_CLIENT_KEY = "rasa"
+
+
 class RasaClient:
     def __init__(self, base_url: str | None = None, timeout: float = 10.0) -> None:
         self.base_url = base_url or settings.RASA_URL.rstrip("/")
         self.timeout = timeout
+        # One pooled client per instance keeps connections to Rasa alive across messages
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+        )
 
     async def send_message(self, sender_id: str, message: str) -> List[Dict[str, Any]]:
-        url = f"{self.base_url}/webhooks/rest/webhook"
         payload = {"sender": sender_id, "message": message}
-        logger.debug(f"Rasa request: {payload}")
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            logger.debug(f"Rasa response: {data}")
-            return data  # Typically list of messages: {text, image, buttons, ...}
+        # Lazy: the payload/response reprs are only built if DEBUG is actually emitted
+        logger.opt(lazy=True).debug("Rasa request: {}", lambda: payload)
+        resp = await self._client.post("/webhooks/rest/webhook", json=payload)
+        resp.raise_for_status()
+        data = resp.json()
+        logger.opt(lazy=True).debug("Rasa response: {}", lambda: data)
+        return data  # Typically list of messages: {text, image, buttons, ...}
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+async def connect_to_rasa(app: FastAPI) -> None:
+    app.state.__setattr__(RASA_CLIENT_KEY, RasaClient())
+
+
+async def close_rasa_connection(app: FastAPI) -> None:
+    client: RasaClient | None = getattr(app.state, RASA_CLIENT_KEY, None)
+    if client:
+        await client.aclose()
+
+
+def get_rasa(app: FastAPI) -> RasaClient:
+    return getattr(app.state, RASA_CLIENT_KEY)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from loguru import logger
+
+from ..core.config import settings
+
+try:
+    import faiss  # type: ignore
+    import numpy as np
+    from sentence_transformers import SentenceTransformer  # type: ignore
+except Exception:  # Optional: only needed when SEMANTIC_CACHE_ENABLED
+    faiss = None  # type: ignore
+    SentenceTransformer = None  # type: ignore
+
+
+SEMANTIC_CACHE_KEY = "semantic_cache"
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over sentence embeddings, so near-identical prompts share one answer.
+
+    Each namespace ("tts", "nlp", ...) owns a ``faiss.IndexFlatIP`` over
+    L2-normalised MiniLM embeddings (inner product == cosine similarity) and a
+    parallel list of cached values. Entries beyond ``max_entries`` are evicted
+    oldest-first.
+    """
+
+    def __init__(self, model_name: str, threshold: float = 0.92, max_entries: int = 2048) -> None:
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self._encoder: Optional[SentenceTransformer] = None
+        self._spaces: Dict[str, Tuple[Any, List[Any]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        if self._encoder is None:
+            if SentenceTransformer is None or faiss is None:
+                raise RuntimeError(
+                    "Semantic cache needs sentence-transformers and faiss. Install with: "
+                    "python -m pip install sentence-transformers faiss-cpu"
+                )
+            logger.info(f"Loading sentence embedding model: {self.model_name}")
+            self._encoder = SentenceTransformer(self.model_name)
+
+    def embed(self, text: str):
+        self.load()
+        assert self._encoder is not None
+        vec = self._encoder.encode([text], normalize_embeddings=True)
+        return np.asarray(vec, dtype=np.float32)
+
+    def _space(self, namespace: str) -> Tuple[Any, List[Any]]:
+        if namespace not in self._spaces:
+            assert self._encoder is not None
+            self._spaces[namespace] = (faiss.IndexFlatIP(self._encoder.get_sentence_embedding_dimension()), [])
+        return self._spaces[namespace]
+
+    def lookup(self, namespace: str, vec) -> Any | None:
+        with self._lock:
+            index, values = self._space(namespace)
+            if index.ntotal == 0:
+                return None
+            scores, ids = index.search(vec, 1)
+            score, idx = float(scores[0][0]), int(ids[0][0])
+            if idx < 0 or score < self.threshold:
+                return None
+            logger.debug("Semantic cache hit ({}) score={:.3f}", namespace, score)
+            return values[idx]
+
+    def add(self, namespace: str, vec, value: Any) -> None:
+        with self._lock:
+            index, values = self._space(namespace)
+            if index.ntotal >= self.max_entries:
+                # IndexFlat compacts ids on removal, so dropping the oldest ids keeps values aligned
+                index.remove_ids(np.arange(index.ntotal - self.max_entries + 1, dtype=np.int64))
+                del values[: len(values) - self.max_entries + 1]
+            index.add(vec)
+            values.append(value)
+
+
+async def load_semantic_cache(app: FastAPI) -> None:
+    cache: Optional[SemanticCache] = None
+    if settings.SEMANTIC_CACHE_ENABLED:
+        cache = SemanticCache(
+            settings.SEMANTIC_CACHE_MODEL,
+            threshold=float(settings.SEMANTIC_CACHE_THRESHOLD),
+            max_entries=int(settings.SEMANTIC_CACHE_MAX_ENTRIES),
+        )
+        try:
+            await asyncio.to_thread(cache.load)
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled: {e}")
+            cache = None
+    app.state.__setattr__(SEMANTIC_CACHE_KEY, cache)
+
+
+def get_semantic_cache(app: FastAPI) -> SemanticCache | None:
+    return getattr(app.state, SEMANTIC_CACHE_KEY, None)
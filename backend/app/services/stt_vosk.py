@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterable, Optional
 
+from fastapi import FastAPI
 from loguru import logger
 
 try:
@@ -15,6 +18,12 @@ except Exception:  # Library may not be available in all environments
     KaldiRecognizer = None  # type: ignore
 
 
+STT_KEY = "stt"
+
+# Set by preload_stt() at import time so a pre-forking server shares one loaded model
+_preloaded: Optional["VoskSTT"] = None
+
+
 class VoskSTT:
     def __init__(self, model_path: str | Path | None = None) -> None:
         # Resolve model path priority:
@@ -58,29 +67,111 @@ class VoskSTT:
         assert self._model is not None
         return self._model
 
-    def transcribe_wav(self, wav_path: str | Path) -> str:
+    def transcribe_wav(self, wav_path: str | Path | BinaryIO) -> str:
         self.load()
         assert self._model is not None
 
-        with wave.open(str(wav_path), "rb") as wf:
+        src = wav_path if hasattr(wav_path, "read") else str(wav_path)
+        with wave.open(src, "rb") as wf:  # type: ignore[arg-type]
             # Require mono and 16-bit PCM; allow any sample rate
             if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
                 raise ValueError(
                     "WAV must be mono 16-bit PCM. Tip: install FFmpeg and we will auto-convert (winget install FFmpeg.FFmpeg)."
                 )
 
-            rec = KaldiRecognizer(self._model, wf.getframerate())  # type: ignore[arg-type]
-            rec.SetWords(True)
-            text = []
-            while True:
-                data = wf.readframes(4000)
-                if len(data) == 0:
-                    break
-                if rec.AcceptWaveform(data):
-                    res = rec.Result()
-                    text.append(json.loads(res).get("text", ""))
-            final = json.loads(rec.FinalResult()).get("text", "")
-            text.append(final)
-            out = " ".join(t for t in text if t)
-            logger.debug(f"Transcription: {out}")
-            return out
+            return self._transcribe_chunks(iter(lambda: wf.readframes(4000), b""), wf.getframerate())
+
+    def transcribe_pcm(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        """Transcribe raw mono s16le PCM (e.g. ffmpeg stdout) without a WAV container."""
+        self.load()
+        assert self._model is not None
+
+        step = 8000  # 4000 frames of 16-bit mono, same as transcribe_wav
+        return self._transcribe_chunks((pcm[i : i + step] for i in range(0, len(pcm), step)), sample_rate)
+
+    def _transcribe_chunks(self, chunks: Iterable[bytes], sample_rate: int) -> str:
+        rec = KaldiRecognizer(self._model, sample_rate)  # type: ignore[arg-type]
+        rec.SetWords(True)
+        text = []
+        for data in chunks:
+            if rec.AcceptWaveform(data):
+                res = rec.Result()
+                text.append(json.loads(res).get("text", ""))
+        final = json.loads(rec.FinalResult()).get("text", "")
+        text.append(final)
+        out = " ".join(t for t in text if t)
+        logger.debug("Transcription: {}", out)
+        return out
+
+
+class VoskSession:
+    """Streaming recognizer on the shared model for one /ws/stt connection.
+
+    Kaldi decoding is CPU-bound C, so calls run in a worker thread; Vosk
+    recognizers are not thread-safe, so they are serialized per session: the
+    asyncio lock keeps calls in arrival order, and the thread lock is held by
+    the worker thread itself, so a call whose awaiter was cancelled (e.g. by a
+    timeout) still finishes before the next one touches the recognizer.
+    """
+
+    def __init__(self, model, sample_rate: int = 16000) -> None:
+        self.rec = KaldiRecognizer(model, sample_rate)
+        self.rec.SetWords(True)
+        self._lock = asyncio.Lock()
+        self._thread_lock = threading.Lock()
+
+    def _step(self, pcm: bytes) -> tuple[bool, str]:
+        with self._thread_lock:
+            if self.rec.AcceptWaveform(pcm):
+                raw = self.rec.Result()
+                # Drop decoder state for the finished utterance so long sessions stay bounded;
+                # the model is shared, so this is cheap
+                self.rec.Reset()
+                return True, raw
+            return False, self.rec.PartialResult()
+
+    def _final(self) -> str:
+        with self._thread_lock:
+            return self.rec.FinalResult()
+
+    async def accept(self, pcm: bytes) -> tuple[bool, str]:
+        """Feed PCM; returns (is_final, raw Vosk JSON of the Result or PartialResult)."""
+        async with self._lock:
+            return await asyncio.to_thread(self._step, pcm)
+
+    async def final(self) -> str:
+        async with self._lock:
+            return await asyncio.to_thread(self._final)
+
+    async def close(self) -> None:
+        pass
+
+
+def preload_stt() -> None:
+    """Load the Vosk model in the importing process.
+
+    Under ``gunicorn --preload`` this runs once in the master; forked workers
+    then share the model pages copy-on-write instead of each loading a copy.
+    """
+    global _preloaded
+    stt = VoskSTT()
+    try:
+        stt.load()
+    except Exception as e:
+        logger.warning(f"Vosk model not preloaded: {e}")
+    _preloaded = stt
+
+
+async def load_stt(app: FastAPI) -> None:
+    stt = _preloaded or VoskSTT()
+    try:
+        # Model load is a multi-second blocking read; keep it off the event loop
+        await asyncio.to_thread(stt.load)
+    except Exception as e:
+        # Leave it lazy so requests surface the same error the endpoints always did
+        logger.warning(f"Vosk model not preloaded: {e}")
+    app.state.__setattr__(STT_KEY, stt)
+
+
+def get_stt(app: FastAPI) -> VoskSTT:
+    return getattr(app.state, STT_KEY)
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI
+from loguru import logger
+
+from ..core.config import settings
+from .stt_vosk import VoskSession, VoskSTT, get_stt
+
+try:
+    from vosk import Model, KaldiRecognizer
+except Exception:  # Library may not be available in all environments
+    Model = None  # type: ignore
+    KaldiRecognizer = None  # type: ignore
+
+
+STT_WORKERS_KEY = "stt_workers"
+
+# Worker-process globals, set by _init_worker
+_model = None
+_recognizers: Dict[int, "KaldiRecognizer"] = {}
+
+
+def _init_worker(model_path: str) -> None:
+    global _model
+    _model = Model(model_path)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _open(session_id: int, sample_rate: int) -> None:
+    rec = KaldiRecognizer(_model, sample_rate)
+    rec.SetWords(True)
+    _recognizers[session_id] = rec
+
+
+def _accept(session_id: int, pcm: bytes) -> tuple[bool, str]:
+    rec = _recognizers[session_id]
+    if rec.AcceptWaveform(pcm):
+        raw = rec.Result()
+        rec.Reset()
+        return True, raw
+    return False, rec.PartialResult()
+
+
+def _final(session_id: int) -> str:
+    return _recognizers[session_id].FinalResult()
+
+
+def _close(session_id: int) -> None:
+    _recognizers.pop(session_id, None)
+
+
+class ProcessSession:
+    """Same interface as VoskSession, but the recognizer lives in a worker process.
+
+    A session is pinned to one single-process shard, so its calls run in order
+    against the same recognizer. If that worker dies, the shard is replaced and
+    the session carries on with an in-process recognizer; audio already fed to
+    the dead one is lost, so the current utterance restarts.
+    """
+
+    def __init__(self, pool: "SttWorkerPool", shard: ProcessPoolExecutor, session_id: int, sample_rate: int) -> None:
+        self._pool = pool
+        self._shard = shard
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self._local: VoskSession | None = None
+
+    async def _call(self, fn, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._shard, fn, self.session_id, *args)
+        except BrokenProcessPool:
+            self._pool.replace(self._shard)
+            raise
+
+    def _fall_back(self) -> VoskSession:
+        logger.warning(f"STT worker for session {self.session_id} died; continuing in-process")
+        self._local = self._pool.local_session(self.sample_rate)
+        return self._local
+
+    async def accept(self, pcm: bytes) -> tuple[bool, str]:
+        if self._local is None:
+            try:
+                return await self._call(_accept, pcm)
+            except BrokenProcessPool:
+                self._fall_back()
+        assert self._local is not None
+        return await self._local.accept(pcm)
+
+    async def final(self) -> str:
+        if self._local is None:
+            try:
+                return await self._call(_final)
+            except BrokenProcessPool:
+                self._fall_back()
+        assert self._local is not None
+        return await self._local.final()
+
+    async def close(self) -> None:
+        if self._local is not None:
+            return
+        try:
+            await self._call(_close)
+        except Exception:
+            pass
+
+
+class SttWorkerPool:
+    """Vosk recognizers for /ws/stt spread over worker processes, one model copy each.
+
+    Recognizer state can't move between processes, so instead of one shared
+    ProcessPoolExecutor (which hands each call to any idle worker) there is one
+    single-worker executor per shard, and sessions are assigned round-robin.
+    A shard whose worker died (Kaldi crash, OOM kill) is broken for good, so it
+    is swapped for a fresh one as soon as a call reports BrokenProcessPool.
+    """
+
+    def __init__(self, stt: VoskSTT, workers: int) -> None:
+        self._stt = stt
+        self._model_path = str(stt.model_path)
+        self._shards: List[ProcessPoolExecutor] = [self._new_shard() for _ in range(max(1, workers))]
+        self._ids = itertools.count()
+
+    def _new_shard(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the parent already runs threads (default executor, ffmpeg pool)
+        ctx = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=_init_worker, initargs=(self._model_path,))
+
+    def replace(self, shard: ProcessPoolExecutor) -> None:
+        """Swap a broken shard for a new worker; a no-op if another session already did."""
+        try:
+            index = self._shards.index(shard)
+        except ValueError:
+            return
+        logger.warning(f"STT worker process {index} died; starting a replacement")
+        self._shards[index] = self._new_shard()
+        shard.shutdown(wait=False, cancel_futures=True)
+        # Load the model in the new worker now rather than on its first session
+        self._shards[index].submit(_ping)
+
+    def local_session(self, sample_rate: int) -> VoskSession:
+        return VoskSession(self._stt.get_model(), sample_rate)
+
+    def warm(self) -> None:
+        # Start every worker and load its model now rather than on the first call
+        for shard in self._shards:
+            shard.submit(_ping).result()
+
+    async def open(self, sample_rate: int) -> ProcessSession | VoskSession:
+        session_id = next(self._ids)
+        shard = self._shards[session_id % len(self._shards)]
+        try:
+            await asyncio.get_running_loop().run_in_executor(shard, _open, session_id, sample_rate)
+        except BrokenProcessPool:
+            # The replacement is still loading its model; don't make this caller wait for it
+            self.replace(shard)
+            return self.local_session(sample_rate)
+        return ProcessSession(self, shard, session_id, sample_rate)
+
+    def shutdown(self) -> None:
+        for shard in self._shards:
+            shard.shutdown(wait=False, cancel_futures=True)
+
+
+async def start_stt_workers(app: FastAPI) -> None:
+    pool: Optional[SttWorkerPool] = None
+    workers = int(settings.STT_PROCESS_WORKERS or 0)
+    if workers > 0:
+        workers = min(workers, os.cpu_count() or 1)
+        pool = SttWorkerPool(get_stt(app), workers)
+        try:
+            await asyncio.to_thread(pool.warm)
+            logger.info(f"STT worker processes ready: {workers}")
+        except Exception as e:
+            logger.warning(f"STT worker processes disabled, decoding in-process: {e}")
+            pool.shutdown()
+            pool = None
+    app.state.__setattr__(STT_WORKERS_KEY, pool)
+
+
+async def stop_stt_workers(app: FastAPI) -> None:
+    pool: SttWorkerPool | None = getattr(app.state, STT_WORKERS_KEY, None)
+    if pool:
+        pool.shutdown()
+
+
+def get_stt_workers(app: FastAPI) -> SttWorkerPool | None:
+    return getattr(app.state, STT_WORKERS_KEY, None)
+
+
+async def open_recognizer(app: FastAPI, sample_rate: int = 16000) -> VoskSession | ProcessSession:
+    """Recognizer session for one stream: in a worker process when enabled, else on the shared in-process model."""
+    pool = get_stt_workers(app)
+    if pool:
+        return await pool.open(sample_rate)
+    return VoskSession(get_stt(app).get_model(), sample_rate)
@@ -1,35 +1,160 @@
 from __future__ import annotations
 
+import hashlib
+import os
+import struct
+import threading
+import uuid
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
+from fastapi import FastAPI
 from loguru import logger
 
+from ..core.config import settings
+
 try:
-    # Coqui TTS synthesizer
+    # Coqui TTS synthesizer (numpy comes with it)
+    import numpy as np
     from TTS.api import TTS  # type: ignore
 except Exception:
     TTS = None  # type: ignore
 
 
+TTS_KEY = "tts"
+
+# RIFF/data sizes for a WAV whose length is unknown while streaming
+WAV_STREAMING_SIZE = 0xFFFFFFFF
+
+
+def _wav_header(sample_rate: int, data_bytes: int | None = None) -> bytes:
+    """44-byte header for mono 16-bit PCM; ``data_bytes=None`` marks an open-ended stream."""
+    data_size = WAV_STREAMING_SIZE if data_bytes is None else data_bytes
+    riff_size = WAV_STREAMING_SIZE if data_bytes is None else 36 + data_bytes
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", data_size,
+    )
+
+
+def _to_pcm16(wav) -> bytes:
+    # Peak-normalise like Coqui's save_wav (what tts_to_file wrote), so streamed and cached
+    # audio keep the level responses always had
+    x = np.asarray(wav, dtype=np.float32)
+    peak = float(np.max(np.abs(x))) if x.size else 0.0
+    return (x * (32767 / max(0.01, peak))).astype("<i2").tobytes()
+
+
 class CoquiTTS:
     def __init__(self, model_name: str = "tts_models/en/ljspeech/tacotron2-DDC", out_dir: str | Path = "/data/tts") -> None:
         self.model_name = model_name
         self.out_dir = Path(out_dir)
         self._tts: Optional[TTS] = None
+        # One instance serves every request: load once, and run one synthesis at a time on the model
+        self._load_lock = threading.Lock()
+        self._synth_lock = threading.Lock()
         self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_dir = self.out_dir / "cache"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
 
     def load(self) -> None:
-        if self._tts is None:
-            if TTS is None:
-                raise RuntimeError("Coqui TTS is not available in the environment")
-            logger.info(f"Loading Coqui TTS model: {self.model_name}")
-            self._tts = TTS(self.model_name)
+        with self._load_lock:
+            if self._tts is None:
+                if TTS is None:
+                    raise RuntimeError("Coqui TTS is not available in the environment")
+                logger.info(f"Loading Coqui TTS model: {self.model_name}")
+                self._tts = TTS(self.model_name)
 
     def synthesize_to_file(self, text: str, filename: str = "out.wav") -> Path:
         self.load()
         assert self._tts is not None
         out_path = self.out_dir / filename
         logger.debug(f"Synthesizing TTS to {out_path}")
-        self._tts.tts_to_file(text=text, file_path=str(out_path))
+        with self._synth_lock:
+            self._tts.tts_to_file(text=text, file_path=str(out_path))
         return out_path
+
+    def cache_key(self, text: str) -> str:
+        # The model fixes both voice and sample rate, so it is part of the key
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def cache_path(self, text: str) -> Path:
+        return self.cache_dir / f"{self.cache_key(text)}.wav"
+
+    def cached(self, text: str) -> Path | None:
+        """Return the cached WAV for ``text`` if present (refreshing its LRU position)."""
+        if int(settings.TTS_CACHE_MAX_FILES or 0) <= 0:
+            return None
+        cache_path = self.cache_path(text)
+        if not cache_path.exists():
+            return None
+        logger.debug(f"TTS cache hit {cache_path.name}")
+        # Touch so eviction treats mtime as last use (LRU)
+        os.utime(cache_path)
+        return cache_path
+
+    def synthesize_iter(self, text: str) -> Iterator[bytes]:
+        """Yield a streaming WAV: the header first, then 16-bit PCM one sentence at a time.
+
+        When the cache is enabled the same bytes are written beside the cache
+        entry and renamed into place (with real sizes in the header) once the
+        last sentence is done, so an aborted stream never leaves a partial WAV.
+        """
+        self.load()
+        assert self._tts is not None
+        sample_rate = int(self._tts.synthesizer.output_sample_rate)
+        max_files = int(settings.TTS_CACHE_MAX_FILES or 0)
+        cache_path = self.cache_path(text)
+        tmp_path = self.cache_dir / f"{cache_path.stem}.{uuid.uuid4().hex}.tmp.wav"
+        sink = open(tmp_path, "wb") if max_files > 0 else None
+        try:
+            yield _wav_header(sample_rate)
+            if sink:
+                sink.write(_wav_header(sample_rate, 0))
+            written = 0
+            sentences = self._tts.synthesizer.split_into_sentences(text) or [text]
+            logger.debug(f"Streaming TTS synthesis ({len(sentences)} sentence(s))")
+            for sentence in sentences:
+                with self._synth_lock:
+                    wav = self._tts.tts(text=sentence, split_sentences=False)
+                pcm = _to_pcm16(wav)
+                if sink:
+                    sink.write(pcm)
+                written += len(pcm)
+                yield pcm
+            if sink:
+                sink.seek(0)
+                sink.write(_wav_header(sample_rate, written))
+                sink.close()
+                sink = None
+                os.replace(tmp_path, cache_path)
+                self._evict(max_files)
+        finally:
+            if sink:
+                sink.close()
+            tmp_path.unlink(missing_ok=True)
+
+    def _evict(self, max_files: int) -> None:
+        entries = [p for p in self.cache_dir.glob("*.wav") if not p.name.endswith(".tmp.wav")]
+        if len(entries) <= max_files:
+            return
+        entries.sort(key=lambda p: p.stat().st_mtime)
+        for stale in entries[: len(entries) - max_files]:
+            stale.unlink(missing_ok=True)
+
+
+async def load_tts(app: FastAPI) -> None:
+    # The model itself still loads on first use (Coqui may have to download it), but only once
+    tts: Optional[CoquiTTS] = None
+    try:
+        tts = CoquiTTS()
+    except Exception as e:
+        logger.warning(f"TTS not initialised: {e}")
+    app.state.__setattr__(TTS_KEY, tts)
+
+
+def get_tts(app: FastAPI) -> CoquiTTS:
+    # A fresh instance when startup failed, so the request reports that error itself
+    return getattr(app.state, TTS_KEY, None) or CoquiTTS()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import functools
+
+from ..core.config import settings
+
+try:
+    import numpy as np
+    import onnxruntime as ort  # type: ignore
+except Exception:  # Optional: only needed when VAD_BACKEND=silero
+    ort = None  # type: ignore
+
+
+class SileroVAD:
+    """Speech probability per window from a Silero VAD ONNX model (v4 or v5 export).
+
+    The ONNX session is shared by every stream; the recurrent state lives here,
+    one instance per stream. Windows are 512 samples at 16 kHz and 256 at 8 kHz.
+    """
+
+    def __init__(self, session, sample_rate: int) -> None:
+        if sample_rate not in (8000, 16000):
+            raise ValueError(f"Silero VAD supports 8000/16000 Hz, got {sample_rate}")
+        self.session = session
+        self.sr = sample_rate
+        self.window = 512 if sample_rate == 16000 else 256
+        self.window_bytes = self.window * 2
+        self._sr = np.array(sample_rate, dtype=np.int64)
+        # v5 takes a single "state" tensor and expects the tail of the previous window prepended;
+        # v4 takes separate LSTM "h"/"c" tensors
+        self._v5 = "state" in {i.name for i in session.get_inputs()}
+        self._context_size = (64 if sample_rate == 16000 else 32) if self._v5 else 0
+        self.reset()
+
+    def reset(self) -> None:
+        if self._v5:
+            self._state = np.zeros((2, 1, 128), dtype=np.float32)
+        else:
+            self._h = np.zeros((2, 1, 64), dtype=np.float32)
+            self._c = np.zeros((2, 1, 64), dtype=np.float32)
+        self._context = np.zeros((1, self._context_size), dtype=np.float32)
+
+    def speech_prob(self, window: bytes) -> float:
+        x = np.frombuffer(window, dtype="<i2").astype(np.float32).reshape(1, -1)
+        x /= 32768.0
+        if self._v5:
+            x = np.concatenate([self._context, x], axis=1)
+            out, self._state = self.session.run(None, {"input": x, "state": self._state, "sr": self._sr})
+            self._context = x[:, -self._context_size:]
+        else:
+            out, self._h, self._c = self.session.run(None, {"input": x, "sr": self._sr, "h": self._h, "c": self._c})
+        return float(out[0][0])
+
+
+@functools.lru_cache(maxsize=1)
+def _load_session(model_path: str):
+    opts = ort.SessionOptions()
+    # Each call is a tiny RNN step; extra intra-op threads only add wake-ups across concurrent streams
+    opts.intra_op_num_threads = 1
+    opts.inter_op_num_threads = 1
+    return ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+def create_silero_vad(sample_rate: int) -> SileroVAD:
+    if ort is None:
+        raise RuntimeError("Silero VAD needs onnxruntime. Install with: python -m pip install onnxruntime")
+    if not settings.SILERO_VAD_MODEL:
+        raise RuntimeError("SILERO_VAD_MODEL is not set (path to silero_vad.onnx)")
+    return SileroVAD(_load_session(settings.SILERO_VAD_MODEL), sample_rate)
@@ -0,0 +1,32 @@
+# Production launcher: one Uvicorn worker per core sharing a preloaded Vosk model.
+#
+#   cd backend && gunicorn app.main:app
+#
+# preload_app imports app.main in the master, which loads the Vosk model once
+# (see preload_stt); forked workers share those pages copy-on-write. Per-process
+# resources (ffmpeg pool, Rasa/Mongo clients, executors) are created in each
+# worker's startup hook after the fork. Gunicorn needs a POSIX host; on Windows
+# keep using `uvicorn app.main:app --port 5000`.
+#
+# Workers run on uvloop with websocket permessage-deflate off (SERVER_LOOP /
+# WS_PER_MESSAGE_DEFLATE in app/core/config.py).
+import multiprocessing
+import os
+
+from uvicorn.workers import UvicornWorker
+
+from app.core.config import settings
+
+
+class CallbotUvicornWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "loop": settings.SERVER_LOOP,
+        "ws_per_message_deflate": settings.WS_PER_MESSAGE_DEFLATE,
+    }
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = CallbotUvicornWorker
+preload_app = True